@@ -1,13 +1,27 @@
 from dotenv import load_dotenv
 load_dotenv()
 import os
+import re
+import atexit
 import sys
+import time
 import sqlite3
 import logging
-from datetime import datetime
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import groupby
+from datetime import date
+from functools import lru_cache
 
 import anthropic
 
+try:
+    import fcntl
+except ImportError:  # Windows: schema setup just isn't serialised across processes
+    fcntl = None
+
 # ---------------------------------------------------------------------------
 # Logging
 # ---------------------------------------------------------------------------
@@ -46,26 +60,43 @@ class InputError(Exception):
 
 MAX_INPUT_LENGTH = 1000          # characters
 MAX_TOOL_ROUNDS = 10             # safety cap on tool-use loops
-VALID_PRIORITIES = {"low", "medium", "high", "urgent"}
-VALID_STATUSES = {"pending", "in_progress", "completed"}
+MAX_TOKENS_SHORT = 256           # output budget for confirmations / tool calls
+MAX_TOKENS_LONG = 1024           # output budget right after list_tasks results
+SQLITE_CACHED_STATEMENTS = 256   # per-connection prepared-statement cache
+RESPONSE_CACHE_SIZE = 128        # replies kept for repeated read-only commands
+MAX_PARALLEL_READS = 4           # worker threads for read-only tool rounds
+MEMORY_BACKUP_INTERVAL = 30      # seconds between snapshots in memory mode
+TODAY_REFRESH_INTERVAL = 60      # seconds today_str() reuses its value
+# Interned frozensets: lookups with an interned key hit on identity
+VALID_PRIORITIES = frozenset(sys.intern(s) for s in ("low", "medium", "high", "urgent"))
+# Stored alongside priority so sorting by importance can use an index
+_PRIORITY_RANK = {"urgent": 0, "high": 1, "medium": 2, "low": 3}
+VALID_STATUSES = frozenset(sys.intern(s) for s in ("pending", "in_progress", "completed"))
 
 # ---------------------------------------------------------------------------
 # Configuration
 # ---------------------------------------------------------------------------
 
 DATABASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tasks.db")
+# "file" (default) or "memory": serve from RAM, snapshotting to DATABASE_PATH.
+# Memory mode is CLI-only: its shared-cache connections fail concurrent
+# reads and writes with "table is locked", so app.py refuses it.
+DB_MODE = os.environ.get("TASKS_DB_MODE", "file").strip().lower()
 MODEL = "claude-sonnet-4-5-20250929"
 
 # Deferred API key check — don't crash at import time so Flask can still
 # serve a helpful error page.  CLI mode calls _require_api_key() in main().
 _api_key = os.environ.get("ANTHROPIC_API_KEY")
-client = None
+_CLIENT = None
 
 def _require_api_key():
-    """Initialise the Anthropic client, raising ConfigError if the key is absent."""
-    global client, _api_key
-    if client is not None:
-        return
+    """Return the Anthropic client, initialising it on first use.
+
+    Raises ConfigError if the key is absent.
+    """
+    global _CLIENT, _api_key
+    if _CLIENT is not None:
+        return _CLIENT
     _api_key = os.environ.get("ANTHROPIC_API_KEY")
     if not _api_key:
         raise ConfigError(
@@ -73,9 +104,10 @@ def _require_api_key():
             "Create a .env file with your key or run: export ANTHROPIC_API_KEY='your-key-here'"
         )
     try:
-        client = anthropic.Anthropic()
+        _CLIENT = anthropic.Anthropic()
     except Exception as e:
         raise ConfigError(f"Failed to initialise Anthropic client: {e}")
+    return _CLIENT
 
 # Try to init eagerly (best-effort) so tools/prompt stay importable
 try:
@@ -83,7 +115,28 @@ try:
 except ConfigError:
     log.warning("ANTHROPIC_API_KEY not set — API calls will fail until it is configured.")
 
-SYSTEM_PROMPT = """You are a helpful task manager assistant. The user will give you natural language \
+# (YYYY-MM-DD, time.monotonic() when computed); see today_str()
+_today_cache = ("", 0.0)
+
+
+def today_str():
+    """Today's date as YYYY-MM-DD, recomputed at most once a minute.
+
+    Overdue flags and the prompt date don't need second precision, so the
+    date may lag midnight by up to TODAY_REFRESH_INTERVAL.
+    """
+    global _today_cache
+    value, computed_at = _today_cache
+    now = time.monotonic()
+    if not value or now - computed_at >= TODAY_REFRESH_INTERVAL:
+        value = date.today().isoformat()
+        _today_cache = (value, now)
+    return value
+
+
+# {today} is filled in by _system_prompt_for() so long-running processes
+# never send a stale date.
+_SYSTEM_PROMPT_TEMPLATE = """You are a helpful task manager assistant. The user will give you natural language \
 commands to manage their to-do list. Use the provided tools to add, list, update, complete, or \
 delete tasks.
 
@@ -101,30 +154,207 @@ Pass the category as a short lowercase label (e.g. "shopping", "work", "personal
 If the user doesn't specify a category, omit it — do NOT default to one.
 
 When listing tasks, you can filter by category using the category parameter. \
-You can also sort results by due_date to show the most urgent tasks first.""".format(
-    today=datetime.now().strftime("%Y-%m-%d")
-)
+You can also sort results by due_date to show the most urgent tasks first."""
+
+
+@lru_cache(maxsize=1)
+def _system_prompt_for(date_str):
+    """Return the system prompt for a YYYY-MM-DD date (formatted once per day)."""
+    return _SYSTEM_PROMPT_TEMPLATE.format(today=date_str)
+
+
+@lru_cache(maxsize=1)
+def _system_blocks_for(date_str):
+    """Return the system prompt as a structured block marked as a prompt-cache breakpoint.
+
+    Together with the breakpoint on the last tool, the whole tools + system
+    prefix is served from Anthropic's prompt cache on every call after the first.
+    """
+    return [
+        {"type": "text", "text": _system_prompt_for(date_str), "cache_control": {"type": "ephemeral"}},
+    ]
+
 
 # ---------------------------------------------------------------------------
 # Database
 # ---------------------------------------------------------------------------
 
 
-def init_db():
-    """Create the users and tasks tables if they don't exist and return the connection.
+# Set once init_db() has run in this process; later connections skip the DDL.
+_schema_ready = False
+
+# One connection per thread, created lazily by get_conn().
+_CONN_POOL = threading.local()
+
+# Memory mode: every connection opens the same shared-cache in-memory database.
+# _memory_anchor keeps it alive for the process lifetime and is the source
+# for snapshots back to DATABASE_PATH.
+_MEMORY_URI = "file:tasks-memory?mode=memory&cache=shared"
+_memory_anchor = None
+_memory_lock = threading.Lock()
+
+
+def _ensure_memory_db():
+    """Load DATABASE_PATH into the shared in-memory database (once per process)."""
+    global _memory_anchor
+    with _memory_lock:
+        if _memory_anchor is not None:
+            return
+        anchor = sqlite3.connect(_MEMORY_URI, uri=True, check_same_thread=False)
+        if os.path.exists(DATABASE_PATH):
+            disk = sqlite3.connect(DATABASE_PATH)
+            try:
+                disk.backup(anchor)
+            finally:
+                disk.close()
+        _memory_anchor = anchor
+    atexit.register(flush_memory_db)
+    _schedule_memory_backup()
+    log.info(f"Serving tasks from memory; snapshots go to {DATABASE_PATH}")
+
+
+def flush_memory_db():
+    """Snapshot the in-memory database to DATABASE_PATH (no-op in file mode)."""
+    if _memory_anchor is None:
+        return
+    with _memory_lock:
+        disk = sqlite3.connect(DATABASE_PATH)
+        try:
+            _memory_anchor.backup(disk)
+        finally:
+            disk.close()
+
 
+def _schedule_memory_backup():
+    def run():
+        try:
+            flush_memory_db()
+        except sqlite3.Error as e:
+            log.error(f"Periodic database snapshot failed: {e}")
+        _schedule_memory_backup()
+
+    timer = threading.Timer(MEMORY_BACKUP_INTERVAL, run)
+    timer.daemon = True
+    timer.start()
+
+
+def connect_db(check_same_thread=True):
+    """Open a connection with the standard PRAGMAs applied.
+
+    Honours TASKS_DB_MODE: in memory mode the connection points at the shared
+    in-memory copy instead of the file.  Pass check_same_thread=False for
+    connections that are pooled and handed between threads.
     Raises DatabaseError on failure.
     """
+    options = {
+        "cached_statements": SQLITE_CACHED_STATEMENTS,
+        "check_same_thread": check_same_thread,
+    }
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        if DB_MODE == "memory":
+            _ensure_memory_db()
+            conn = sqlite3.connect(_MEMORY_URI, uri=True, **options)
+        else:
+            conn = sqlite3.connect(DATABASE_PATH, **options)
         conn.row_factory = sqlite3.Row
     except sqlite3.Error as e:
         raise DatabaseError(f"Cannot open database at {DATABASE_PATH}: {e}")
 
     try:
+        # WAL + synchronous=NORMAL turns each commit into a single append
+        # instead of an fsync of the rollback journal.
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA cache_size = -65536")  # 64 MB
+        conn.execute("PRAGMA mmap_size = 268435456")  # 256 MB
+
         # Enable foreign keys
         conn.execute("PRAGMA foreign_keys = ON")
+    except sqlite3.Error as e:
+        conn.close()
+        raise DatabaseError(f"Failed to configure database connection: {e}")
+
+    return conn
+
+
+def get_conn():
+    """Return this thread's connection, opening it on first use.
+
+    The first connection in the process also creates/migrates the schema.
+    Raises DatabaseError on failure.
+    """
+    conn = getattr(_CONN_POOL, "conn", None)
+    if conn is None:
+        conn = connect_db() if _schema_ready else init_db()
+        _CONN_POOL.conn = conn
+    return conn
+
+
+def close_conn():
+    """Close this thread's pooled connection, if any."""
+    conn = getattr(_CONN_POOL, "conn", None)
+    if conn is not None:
+        _CONN_POOL.conn = None
+        conn.close()
+
+
+# Stored in PRAGMA user_version once _create_schema() has run.  Bump it
+# whenever _create_schema() gains a table, column, migration, index or trigger.
+SCHEMA_VERSION = 2
+
+
+@contextmanager
+def _schema_lock():
+    """Hold an exclusive lock on DATABASE_PATH.initlock (file mode only).
+
+    Gunicorn workers import app.py, and so run init_db(), at the same time;
+    the lock makes sure only one of them runs the DDL.
+    """
+    if fcntl is None or DB_MODE == "memory":
+        yield
+        return
+    with open(DATABASE_PATH + ".initlock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def init_db():
+    """Create the users and tasks tables if they don't exist and return the connection.
+
+    Databases already at SCHEMA_VERSION skip the DDL entirely.
+    Raises DatabaseError on failure.
+    """
+    global _schema_ready
+    conn = connect_db()
+
+    try:
+        if _schema_version(conn) < SCHEMA_VERSION:
+            with _schema_lock():
+                # Another worker may have finished the setup while we waited
+                if _schema_version(conn) < SCHEMA_VERSION:
+                    _create_schema(conn)
+    except (sqlite3.Error, OSError) as e:
+        conn.close()
+        raise DatabaseError(f"Failed to initialise database: {e}")
+
+    _schema_ready = True
+    return conn
+
 
+def _create_schema(conn):
+    """Create tables, run migrations and build indexes, then stamp SCHEMA_VERSION.
+
+    Closes conn and raises DatabaseError on failure.
+    """
+    try:
         # Users table
         conn.execute(
             """
@@ -151,6 +381,35 @@ def init_db():
                 due_date TEXT DEFAULT NULL,
                 category TEXT DEFAULT NULL,
                 user_id INTEGER,
+                priority_rank INTEGER DEFAULT 2,
+                FOREIGN KEY (user_id) REFERENCES users(id)
+            )
+            """
+        )
+
+        # Per-user write counter, maintained by triggers on tasks (below); lets
+        # each web worker tell whether its cached task list is still current
+        # without re-reading the tasks
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS task_revisions (
+                user_id INTEGER PRIMARY KEY,
+                rev INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY (user_id) REFERENCES users(id)
+            )
+            """
+        )
+
+        # Message Batches submitted from the web app; results are applied once
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS command_batches (
+                id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                messages TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                results TEXT DEFAULT NULL,
+                created_at TEXT DEFAULT (datetime('now')),
                 FOREIGN KEY (user_id) REFERENCES users(id)
             )
             """
@@ -182,13 +441,135 @@ def init_db():
             conn.close()
             raise DatabaseError(f"Failed to migrate database (add user_id column): {e}")
 
-    return conn
+    # Migrate: add and backfill priority_rank if it doesn't exist (for existing databases)
+    try:
+        conn.execute("SELECT priority_rank FROM tasks LIMIT 1")
+    except sqlite3.OperationalError:
+        try:
+            conn.execute("ALTER TABLE tasks ADD COLUMN priority_rank INTEGER DEFAULT 2")
+            conn.execute(
+                "UPDATE tasks SET priority_rank = CASE priority "
+                "WHEN 'urgent' THEN 0 WHEN 'high' THEN 1 "
+                "WHEN 'medium' THEN 2 ELSE 3 END"
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.close()
+            raise DatabaseError(f"Failed to migrate database (add priority_rank column): {e}")
+
+    # Migrate: normalise categories to trimmed lowercase so lookups can use
+    # plain equality (and the index below) instead of LOWER()/NOCASE
+    try:
+        conn.execute(
+            "UPDATE tasks SET category = LOWER(TRIM(category)) "
+            "WHERE category IS NOT NULL AND category != LOWER(TRIM(category))"
+        )
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.close()
+        raise DatabaseError(f"Failed to migrate database (normalise categories): {e}")
+
+    # Indexes backing the list_tasks filters and sorts.  Created after the
+    # migrations above so every indexed column is guaranteed to exist.
+    try:
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks(priority)")
+        conn.execute("DROP INDEX IF EXISTS idx_tasks_category_nocase")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_category ON tasks(category)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_due ON tasks(due_date)")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tasks_priority_rank ON tasks(priority_rank)"
+        )
+        # Per-user scans from the web app: the task list (ordered by id) and
+        # the category list
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_id ON tasks(user_id, id)")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tasks_user_category ON tasks(user_id, category)"
+        )
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.close()
+        raise DatabaseError(f"Failed to create indexes: {e}")
+
+    # Keep task_revisions current for every write to a user's tasks, whichever
+    # process or code path makes it (the web app, the CLI, a batch).  Each row
+    # written advances that user's rev by one.
+    _bump_rev = (
+        "INSERT INTO task_revisions (user_id, rev) SELECT {uid}, 1 WHERE {cond} "
+        "ON CONFLICT(user_id) DO UPDATE SET rev = rev + 1;"
+    )
+    try:
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS trg_tasks_rev_insert AFTER INSERT ON tasks BEGIN "
+            + _bump_rev.format(uid="NEW.user_id", cond="NEW.user_id IS NOT NULL")
+            + " END"
+        )
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS trg_tasks_rev_update AFTER UPDATE ON tasks BEGIN "
+            + _bump_rev.format(uid="NEW.user_id", cond="NEW.user_id IS NOT NULL")
+            + _bump_rev.format(
+                uid="OLD.user_id",
+                cond="OLD.user_id IS NOT NULL AND OLD.user_id IS NOT NEW.user_id",
+            )
+            + " END"
+        )
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS trg_tasks_rev_delete AFTER DELETE ON tasks BEGIN "
+            + _bump_rev.format(uid="OLD.user_id", cond="OLD.user_id IS NOT NULL")
+            + " END"
+        )
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.close()
+        raise DatabaseError(f"Failed to create triggers: {e}")
+
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
 
 # ---------------------------------------------------------------------------
 # Input validation helpers
 # ---------------------------------------------------------------------------
 
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_TASK_ID_RE = re.compile(r"[0-9]+")
+
+
+def _intern(value):
+    """sys.intern() strings; pass anything else through for validation to reject."""
+    return sys.intern(value) if type(value) is str else value
+
+
+@lru_cache(maxsize=256)
+def _is_valid_date(value):
+    """True if value is a real YYYY-MM-DD date.
+
+    The regex rejects other ISO forms cheaply; date.fromisoformat (C, far
+    faster than strptime) then rejects impossible dates like 2026-02-30.
+    """
+    if not isinstance(value, str) or not _DATE_RE.match(value):
+        return False
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _parse_task_id(value):
+    """Return value as an int task ID, or None if it isn't an integral value.
+
+    Never rounds: 3.7 or True must not quietly address task 3 or task 1.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    if isinstance(value, str) and _TASK_ID_RE.fullmatch(value):
+        return int(value)
+    return None
+
 
 def validate_user_input(text):
     """Validate raw user input. Raises InputError if invalid."""
@@ -205,7 +586,7 @@ def validate_user_input(text):
 
 def validate_priority(priority):
     """Return a valid priority or raise InputError."""
-    if priority and priority not in VALID_PRIORITIES:
+    if priority and _intern(priority) not in VALID_PRIORITIES:
         raise InputError(
             f"Invalid priority '{priority}'. Must be one of: {', '.join(sorted(VALID_PRIORITIES))}"
         )
@@ -214,7 +595,7 @@ def validate_priority(priority):
 
 def validate_status(status):
     """Return a valid status or raise InputError."""
-    if status and status not in VALID_STATUSES:
+    if status and _intern(status) not in VALID_STATUSES:
         raise InputError(
             f"Invalid status '{status}'. Must be one of: {', '.join(sorted(VALID_STATUSES))}"
         )
@@ -225,9 +606,7 @@ def validate_due_date(due_date):
     """Validate YYYY-MM-DD format. Raises InputError if malformed."""
     if not due_date:
         return due_date
-    try:
-        datetime.strptime(due_date, "%Y-%m-%d")
-    except ValueError:
+    if not _is_valid_date(due_date):
         raise InputError(
             f"Invalid due date '{due_date}'. Expected format: YYYY-MM-DD (e.g. 2026-03-15)"
         )
@@ -398,50 +777,132 @@ TOOLS = [
             },
             "required": ["task_id"],
         },
+        # Cache breakpoint: keep this on the last tool so the full list is cached
+        "cache_control": {"type": "ephemeral"},
     },
 ]
 
+
+@lru_cache(maxsize=1)
+def _static_request_body(date_str):
+    """Return the never-changing part of every request (tools + system) in wire format.
+
+    Passed via extra_body, which the SDK sends as-is.  As typed params the SDK
+    re-walks and transforms the ~4.5KB tools/system structure on every call
+    (roughly 1ms each); this way it is built once per day and only encoded.
+    """
+    return {"tools": TOOLS, "system": _system_blocks_for(date_str)}
+
+
+# ---------------------------------------------------------------------------
+# SQL statements
+# ---------------------------------------------------------------------------
+
+# Fixed SQL text for the hot CRUD path.  sqlite3 keys its prepared-statement
+# cache on the exact string, so reusing these constants skips re-parsing.
+_SQL_INSERT = (
+    "INSERT INTO tasks (title, description, priority, priority_rank, due_date, category, user_id) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+_SQL_EXISTS = "SELECT 1 FROM tasks WHERE id = ?"
+_SQL_EXISTS_FOR_USER = "SELECT 1 FROM tasks WHERE id = ? AND user_id = ?"
+_SQL_COMPLETE = (
+    "UPDATE tasks SET status = 'completed' "
+    "WHERE id = ? AND status IS NOT 'completed' RETURNING *"
+)
+_SQL_COMPLETE_FOR_USER = (
+    "UPDATE tasks SET status = 'completed' "
+    "WHERE id = ? AND user_id = ? AND status IS NOT 'completed' RETURNING *"
+)
+_SQL_DELETE = "DELETE FROM tasks WHERE id = ? RETURNING title"
+_SQL_DELETE_FOR_USER = "DELETE FROM tasks WHERE id = ? AND user_id = ? RETURNING title"
+
+
+def _task_exists(conn, task_id, user_id=None):
+    """True if the task exists (and belongs to user_id when given)."""
+    if user_id is not None:
+        return conn.execute(_SQL_EXISTS_FOR_USER, (task_id, user_id)).fetchone() is not None
+    return conn.execute(_SQL_EXISTS, (task_id,)).fetchone() is not None
+
+
+# ---------------------------------------------------------------------------
+# Write tracking
+# ---------------------------------------------------------------------------
+
+# Bumped after every successful write.  Cached replies are keyed on it, so
+# any mutation implicitly invalidates everything cached before it.
+_db_version = 0
+
+
+def _bump_db_version():
+    global _db_version
+    _db_version += 1
+
+
 # ---------------------------------------------------------------------------
 # Tool handler functions
 # ---------------------------------------------------------------------------
 
+# Every handler takes an optional `changes` list.  When given, each successful
+# write appends a delta describing the affected row, so a caller holding a
+# copy of the task list can patch it instead of re-reading the table:
+#   {"op": "insert" | "update", "row": {...full tasks row...}}
+#   {"op": "delete", "id": task_id}
 
-def handle_add_task(conn, data, user_id=None):
-    try:
-        title = data.get("title", "").strip()
-        if not title:
-            return "Error: task title cannot be empty."
-        if len(title) > 200:
-            return "Error: task title is too long (max 200 characters)."
-
-        description = data.get("description", "")
-        priority = data.get("priority", "medium")
-        if priority not in VALID_PRIORITIES:
-            return f"Error: invalid priority '{priority}'. Use: {', '.join(sorted(VALID_PRIORITIES))}"
-
-        due_date = data.get("due_date")
-        if due_date:
-            try:
-                datetime.strptime(due_date, "%Y-%m-%d")
-            except ValueError:
-                return f"Error: invalid due date format '{due_date}'. Use YYYY-MM-DD."
 
-        category = data.get("category")
-        if category and len(category) > 50:
-            return "Error: category name is too long (max 50 characters)."
+def _prepare_new_task(data, user_id=None):
+    """Validate an add_task payload.
 
-        cursor = conn.execute(
-            "INSERT INTO tasks (title, description, priority, due_date, category, user_id) VALUES (?, ?, ?, ?, ?, ?)",
-            (title, description, priority, due_date, category, user_id),
-        )
-        conn.commit()
-        task_id = cursor.lastrowid
-        result = f"Task added (ID {task_id}): '{title}' | priority: {priority}"
-        if due_date:
-            result += f" | due: {due_date}"
-        if category:
-            result += f" | category: {category}"
-        return result
+    Returns (params for _SQL_INSERT, None) or (None, error message).
+    """
+    title = data.get("title", "").strip()
+    if not title:
+        return None, "Error: task title cannot be empty."
+    if len(title) > 200:
+        return None, "Error: task title is too long (max 200 characters)."
+
+    description = data.get("description", "")
+    priority = _intern(data.get("priority", "medium"))
+    if priority not in VALID_PRIORITIES:
+        return None, f"Error: invalid priority '{priority}'. Use: {', '.join(sorted(VALID_PRIORITIES))}"
+
+    due_date = data.get("due_date")
+    if due_date and not _is_valid_date(due_date):
+        return None, f"Error: invalid due date format '{due_date}'. Use YYYY-MM-DD."
+
+    # Stored lowercase so list_tasks can filter with plain equality
+    category = (data.get("category") or "").strip().lower() or None
+    if category and len(category) > 50:
+        return None, "Error: category name is too long (max 50 characters)."
+
+    return (title, description, priority, _PRIORITY_RANK[priority], due_date, category, user_id), None
+
+
+def _added_message(task_id, params):
+    """Confirmation text for a freshly inserted _SQL_INSERT row."""
+    title, _description, priority, _rank, due_date, category, _user_id = params
+    result = f"Task added (ID {task_id}): '{title}' | priority: {priority}"
+    if due_date:
+        result += f" | due: {due_date}"
+    if category:
+        result += f" | category: {category}"
+    return result
+
+
+def handle_add_task(conn, data, user_id=None, changes=None):
+    try:
+        params, error = _prepare_new_task(data, user_id)
+        if error:
+            return error
+
+        if changes is not None:
+            row = conn.execute(_SQL_INSERT + " RETURNING *", params).fetchone()
+            changes.append({"op": "insert", "row": dict(row)})
+            task_id = row["id"]
+        else:
+            task_id = conn.execute(_SQL_INSERT, params).lastrowid
+        _bump_db_version()
+        return _added_message(task_id, params)
     except sqlite3.Error as e:
         log.error(f"Database error in add_task: {e}")
         return f"Database error while adding task: {e}"
@@ -450,9 +911,51 @@ def handle_add_task(conn, data, user_id=None):
         return f"Error adding task: {e}"
 
 
-def handle_list_tasks(conn, data, user_id=None):
+def handle_add_tasks_bulk(conn, items, user_id=None):
+    """Insert several add_task payloads with a single executemany.
+
+    Returns one result string per payload, in order.  Invalid payloads get
+    their error message and are left out of the insert.
+    """
+    results = [None] * len(items)
+    rows = []
+    slots = []
+    for i, data in enumerate(items):
+        try:
+            params, error = _prepare_new_task(data, user_id)
+        except Exception as e:
+            log.error(f"Unexpected error in add_task: {e}")
+            params, error = None, f"Error adding task: {e}"
+        if error:
+            results[i] = error
+        else:
+            rows.append(params)
+            slots.append(i)
+
+    if not rows:
+        return results
+
     try:
-        query = "SELECT * FROM tasks"
+        conn.executemany(_SQL_INSERT, rows)
+        # executemany leaves cursor.lastrowid unset; IDs are contiguous within
+        # the transaction, so count back from the last one.
+        last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        first_id = last_id - len(rows) + 1
+    except sqlite3.Error as e:
+        log.error(f"Database error in add_tasks_bulk: {e}")
+        for i in slots:
+            results[i] = f"Database error while adding task: {e}"
+        return results
+
+    _bump_db_version()
+    for offset, (i, params) in enumerate(zip(slots, rows)):
+        results[i] = _added_message(first_id + offset, params)
+    return results
+
+
+def handle_list_tasks(conn, data, user_id=None, changes=None):
+    try:
+        query = "SELECT id, title, priority, status, due_date, category FROM tasks"
         conditions = []
         params = []
 
@@ -468,8 +971,8 @@ def handle_list_tasks(conn, data, user_id=None):
             conditions.append("priority = ?")
             params.append(data["priority"])
         if "category" in data:
-            conditions.append("LOWER(category) = LOWER(?)")
-            params.append(data["category"])
+            conditions.append("category = ?")
+            params.append((data["category"] or "").strip().lower())
 
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
@@ -479,31 +982,27 @@ def handle_list_tasks(conn, data, user_id=None):
         if sort_by == "due_date":
             query += " ORDER BY (due_date IS NULL), due_date ASC, id ASC"
         elif sort_by == "priority":
-            query += (
-                " ORDER BY CASE priority "
-                "WHEN 'urgent' THEN 0 WHEN 'high' THEN 1 "
-                "WHEN 'medium' THEN 2 WHEN 'low' THEN 3 END, id ASC"
-            )
+            query += " ORDER BY priority_rank, id ASC"
         elif sort_by == "created_at":
             query += " ORDER BY created_at DESC, id DESC"
         else:
             query += " ORDER BY id"
 
-        rows = conn.execute(query, params).fetchall()
+        # Plain tuples: positional access skips sqlite3.Row's name lookups
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        rows = cursor.execute(query, params).fetchall()
 
         if not rows:
             return "No tasks found."
 
         lines = []
-        for row in rows:
-            line = (
-                f"  [{row['id']}] {row['title']} "
-                f"| priority: {row['priority']} | status: {row['status']}"
-            )
-            if row["due_date"]:
-                line += f" | due: {row['due_date']}"
-            if row["category"]:
-                line += f" | category: {row['category']}"
+        for tid, title, pri, st, due, cat in rows:
+            line = f"  [{tid}] {title} | priority: {pri} | status: {st}"
+            if due:
+                line += f" | due: {due}"
+            if cat:
+                line += f" | category: {cat}"
             lines.append(line)
 
         return f"Found {len(rows)} task(s):\n" + "\n".join(lines)
@@ -515,25 +1014,26 @@ def handle_list_tasks(conn, data, user_id=None):
         return f"Error listing tasks: {e}"
 
 
-def handle_update_task(conn, data, user_id=None):
+def handle_update_task(conn, data, user_id=None, changes=None):
     try:
         task_id = data.get("task_id")
         if task_id is None:
             return "Error: task_id is required."
-
-        if user_id is not None:
-            row = conn.execute("SELECT * FROM tasks WHERE id = ? AND user_id = ?", (task_id, user_id)).fetchone()
-        else:
-            row = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
-        if not row:
-            return f"No task found with ID {task_id}."
+        # An int key lets SQLite take the INTEGER PRIMARY KEY (rowid) fast path
+        task_id = _parse_task_id(task_id)
+        if task_id is None:
+            return "Error: task_id must be an integer."
 
         updatable = ["title", "description", "priority", "status", "due_date", "category"]
         fields = []
         values = []
+        diffs = []        # "field IS NOT ?" — at least one must hold for a real change
+        diff_values = []
         for field in updatable:
             if field in data:
                 val = data[field]
+                if field in ("priority", "status"):
+                    val = _intern(val)
                 # Validate fields
                 if field == "title" and (not val or not val.strip()):
                     return "Error: title cannot be empty."
@@ -541,25 +1041,42 @@ def handle_update_task(conn, data, user_id=None):
                     return f"Error: invalid priority '{val}'."
                 if field == "status" and val not in VALID_STATUSES:
                     return f"Error: invalid status '{val}'."
-                if field == "due_date" and val:
-                    try:
-                        datetime.strptime(val, "%Y-%m-%d")
-                    except ValueError:
-                        return f"Error: invalid due date format '{val}'. Use YYYY-MM-DD."
-                if field == "category" and val == "":
-                    val = None
+                if field == "due_date" and val and not _is_valid_date(val):
+                    return f"Error: invalid due date format '{val}'. Use YYYY-MM-DD."
+                if field == "category":
+                    val = (val or "").strip().lower() or None
                 fields.append(f"{field} = ?")
                 values.append(val)
+                diffs.append(f"{field} IS NOT ?")
+                diff_values.append(val)
+                if field == "priority":
+                    fields.append("priority_rank = ?")
+                    values.append(_PRIORITY_RANK[val])
 
         if not fields:
             return "No fields to update."
 
+        # No pre-SELECT: RETURNING tells us whether anything changed.  Rows
+        # whose values already match are filtered out, so a redundant update
+        # (common when Claude re-confirms) writes nothing.
+        where = "id = ?"
         values.append(task_id)
-        conn.execute(
-            f"UPDATE tasks SET {', '.join(fields)} WHERE id = ?",
+        if user_id is not None:
+            where += " AND user_id = ?"
+            values.append(user_id)
+        where += f" AND ({' OR '.join(diffs)})"
+        values.extend(diff_values)
+        row = conn.execute(
+            f"UPDATE tasks SET {', '.join(fields)} WHERE {where} RETURNING *",
             values,
-        )
-        conn.commit()
+        ).fetchone()
+        if row is None:
+            if _task_exists(conn, task_id, user_id):
+                return f"Task {task_id} unchanged."
+            return f"No task found with ID {task_id}."
+        if changes is not None:
+            changes.append({"op": "update", "row": dict(row)})
+        _bump_db_version()
         return f"Task {task_id} updated successfully."
     except sqlite3.Error as e:
         log.error(f"Database error in update_task: {e}")
@@ -569,26 +1086,28 @@ def handle_update_task(conn, data, user_id=None):
         return f"Error updating task: {e}"
 
 
-def handle_complete_task(conn, data, user_id=None):
+def handle_complete_task(conn, data, user_id=None, changes=None):
     try:
         task_id = data.get("task_id")
         if task_id is None:
             return "Error: task_id is required."
+        task_id = _parse_task_id(task_id)
+        if task_id is None:
+            return "Error: task_id must be an integer."
 
         if user_id is not None:
-            row = conn.execute("SELECT * FROM tasks WHERE id = ? AND user_id = ?", (task_id, user_id)).fetchone()
+            row = conn.execute(_SQL_COMPLETE_FOR_USER, (task_id, user_id)).fetchone()
         else:
-            row = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
-        if not row:
+            row = conn.execute(_SQL_COMPLETE, (task_id,)).fetchone()
+        if row is None:
+            # Nothing updated — either missing or already completed
+            if _task_exists(conn, task_id, user_id):
+                return f"Task {task_id} is already completed."
             return f"No task found with ID {task_id}."
 
-        if row["status"] == "completed":
-            return f"Task {task_id} is already completed."
-
-        conn.execute(
-            "UPDATE tasks SET status = 'completed' WHERE id = ?", (task_id,)
-        )
-        conn.commit()
+        if changes is not None:
+            changes.append({"op": "update", "row": dict(row)})
+        _bump_db_version()
         return f"Task {task_id} marked as completed: '{row['title']}'"
     except sqlite3.Error as e:
         log.error(f"Database error in complete_task: {e}")
@@ -598,21 +1117,25 @@ def handle_complete_task(conn, data, user_id=None):
         return f"Error completing task: {e}"
 
 
-def handle_delete_task(conn, data, user_id=None):
+def handle_delete_task(conn, data, user_id=None, changes=None):
     try:
         task_id = data.get("task_id")
         if task_id is None:
             return "Error: task_id is required."
+        task_id = _parse_task_id(task_id)
+        if task_id is None:
+            return "Error: task_id must be an integer."
 
         if user_id is not None:
-            row = conn.execute("SELECT * FROM tasks WHERE id = ? AND user_id = ?", (task_id, user_id)).fetchone()
+            row = conn.execute(_SQL_DELETE_FOR_USER, (task_id, user_id)).fetchone()
         else:
-            row = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
-        if not row:
+            row = conn.execute(_SQL_DELETE, (task_id,)).fetchone()
+        if row is None:
             return f"No task found with ID {task_id}."
 
-        conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
-        conn.commit()
+        if changes is not None:
+            changes.append({"op": "delete", "id": task_id})
+        _bump_db_version()
         return f"Task {task_id} deleted: '{row['title']}'"
     except sqlite3.Error as e:
         log.error(f"Database error in delete_task: {e}")
@@ -635,6 +1158,10 @@ TOOL_HANDLERS = {
 }
 
 
+# Tools that never write — safe to run concurrently on separate connections
+READ_ONLY_TOOLS = {"list_tasks"}
+
+
 def execute_tool(conn, tool_name, tool_input, user_id=None):
     handler = TOOL_HANDLERS.get(tool_name)
     if handler:
@@ -643,6 +1170,124 @@ def execute_tool(conn, tool_name, tool_input, user_id=None):
     return f"Unknown tool: {tool_name}"
 
 
+_read_executor = None
+
+
+def _get_read_executor():
+    global _read_executor
+    if _read_executor is None:
+        _read_executor = ThreadPoolExecutor(
+            max_workers=MAX_PARALLEL_READS, thread_name_prefix="task-read"
+        )
+    return _read_executor
+
+
+def _execute_pooled(tool_name, tool_input, user_id=None):
+    """Run a tool on the calling thread's pooled connection (read workers)."""
+    return execute_tool(get_conn(), tool_name, tool_input, user_id=user_id)
+
+
+def run_tool_round(conn, tool_uses, user_id=None):
+    """Execute one round of tool_use blocks and return their tool_result dicts in order.
+
+    If every call is read-only they run concurrently, each worker on its own
+    pooled connection (WAL lets readers proceed in parallel).  A round with any
+    write runs sequentially on conn in a single transaction, so later calls
+    still see earlier writes from the same round.
+    """
+    if len(tool_uses) > 1 and all(b.name in READ_ONLY_TOOLS for b in tool_uses):
+        executor = _get_read_executor()
+        futures = [
+            executor.submit(_execute_pooled, b.name, b.input, user_id) for b in tool_uses
+        ]
+        results = [f.result() for f in futures]
+    else:
+        # Handlers don't commit; one transaction per round means one fsync
+        results = []
+        with conn:
+            # Consecutive add_task calls ("add milk, bread and eggs") become
+            # a single executemany
+            for name, group in groupby(tool_uses, key=lambda b: b.name):
+                group = list(group)
+                if name == "add_task" and len(group) > 1:
+                    results.extend(
+                        handle_add_tasks_bulk(conn, [b.input for b in group], user_id=user_id)
+                    )
+                else:
+                    results.extend(
+                        execute_tool(conn, b.name, b.input, user_id=user_id) for b in group
+                    )
+
+    return [
+        {"type": "tool_result", "tool_use_id": b.id, "content": result}
+        for b, result in zip(tool_uses, results)
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Fast path — trivial commands handled without calling Claude
+# ---------------------------------------------------------------------------
+
+_FAST_LIST_RE = re.compile(r"^(?:list|show)(?: all)?(?: tasks)?$")
+_FAST_COMPLETE_RE = re.compile(r"^complete(?: task)? (\d+)$")
+_FAST_DELETE_RE = re.compile(r"^delete(?: task)? (\d+)$")
+
+
+def _fast_dispatch(conn, user_message, user_id=None):
+    """Run unambiguous commands straight against the handlers.
+
+    Returns the handler's result, or None if the message needs Claude.
+    """
+    text = " ".join(user_message.lower().split())
+
+    if _FAST_LIST_RE.match(text):
+        return handle_list_tasks(conn, {}, user_id=user_id)
+
+    m = _FAST_COMPLETE_RE.match(text)
+    if m:
+        with conn:
+            return handle_complete_task(conn, {"task_id": int(m[1])}, user_id=user_id)
+
+    m = _FAST_DELETE_RE.match(text)
+    if m:
+        with conn:
+            return handle_delete_task(conn, {"task_id": int(m[1])}, user_id=user_id)
+
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Response cache
+# ---------------------------------------------------------------------------
+
+_RESPONSE_CACHE = OrderedDict()
+
+
+def _db_state(conn):
+    """Return what a cached reply's freshness depends on for this connection.
+
+    _db_version only sees this process's own writes; PRAGMA data_version
+    changes when another connection commits. data_version is per-connection,
+    so the connection is part of the state too.
+    """
+    return (_db_version, id(conn), conn.execute("PRAGMA data_version").fetchone()[0])
+
+
+def _response_cache_key(conn, user_message, user_id=None):
+    """Key a reply on the normalised command, the database state and the day."""
+    return (user_id, " ".join(user_message.lower().split()), _db_state(conn), today_str())
+
+
+def _cache_response(conn, key, reply):
+    """Store a reply unless the database changed since the key was taken."""
+    if key[2] != _db_state(conn):
+        return
+    _RESPONSE_CACHE[key] = reply
+    _RESPONSE_CACHE.move_to_end(key)
+    while len(_RESPONSE_CACHE) > RESPONSE_CACHE_SIZE:
+        _RESPONSE_CACHE.popitem(last=False)
+
+
 # ---------------------------------------------------------------------------
 # Anthropic API integration
 # ---------------------------------------------------------------------------
@@ -651,18 +1296,48 @@ def execute_tool(conn, tool_name, tool_input, user_id=None):
 def process_user_input(conn, user_message, user_id=None):
     """Send the user's message to Claude and execute any tool calls.
 
+    Pass conn=None to use this thread's pooled connection (see get_conn).
+
     Raises:
         ConfigError  – API key not set.
         APIError     – API call failed after retries.
         InputError   – User input too long / empty.
     """
+    return "".join(stream_user_input(conn, user_message, user_id=user_id))
+
+
+def stream_user_input(conn, user_message, user_id=None):
+    """Like process_user_input, but yield the reply text as Claude streams it.
+
+    Exceptions are the same as process_user_input's and surface during
+    iteration.
+    """
     # Validate
     user_message = validate_user_input(user_message)
 
-    # Ensure client is ready
-    _require_api_key()
+    if conn is None:
+        conn = get_conn()
+
+    # Trivial commands never need the LLM
+    reply = _fast_dispatch(conn, user_message, user_id=user_id)
+    if reply is not None:
+        yield reply
+        return
+
+    # Repeated read-only commands are answered without calling Claude
+    cache_key = _response_cache_key(conn, user_message, user_id)
+    cached = _RESPONSE_CACHE.get(cache_key)
+    if cached is not None:
+        _RESPONSE_CACHE.move_to_end(cache_key)
+        yield cached
+        return
+
+    # Ensure client is ready (one global read once initialised)
+    client = _CLIENT or _require_api_key()
 
     messages = [{"role": "user", "content": user_message}]
+    parts = []  # every chunk yielded so far, for the response cache
+    needs_long_output = False  # set when the last round fed back list_tasks rows
     rounds = 0
 
     while True:
@@ -673,58 +1348,93 @@ def process_user_input(conn, user_message, user_id=None):
                 "The assistant got stuck in a loop. Please try rephrasing your request."
             )
 
-        try:
-            response = client.messages.create(
-                model=MODEL,
-                max_tokens=1024,
-                system=SYSTEM_PROMPT,
-                tools=TOOLS,
-                messages=messages,
-            )
-        except anthropic.AuthenticationError:
-            raise ConfigError(
-                "Invalid API key. Please check your ANTHROPIC_API_KEY and try again."
-            )
-        except anthropic.RateLimitError:
-            raise APIError(
-                "Rate limit exceeded. Please wait a moment and try again."
-            )
-        except anthropic.APIConnectionError:
-            raise APIError(
-                "Cannot reach the Anthropic API. Please check your internet connection."
-            )
-        except anthropic.APIStatusError as e:
-            log.error(f"Anthropic API status error: {e.status_code} — {e.message}")
-            raise APIError(
-                f"The AI service returned an error (HTTP {e.status_code}). Please try again later."
-            )
-        except Exception as e:
-            log.error(f"Unexpected API error: {e}")
+        budget = MAX_TOKENS_LONG if needs_long_output else MAX_TOKENS_SHORT
+        round_text = ""  # text this round has yielded so far
+        while True:
+            try:
+                with client.messages.stream(
+                    model=MODEL,
+                    max_tokens=budget,
+                    messages=messages,
+                    extra_body=_static_request_body(today_str()),
+                ) as stream:
+                    # A retry regenerates the text already shown; skip it while
+                    # it matches, and keep both versions if it diverges
+                    replay = round_text
+                    pending = ""
+                    for text in stream.text_stream:
+                        if replay:
+                            pending += text
+                            if replay.startswith(pending):
+                                continue
+                            if pending.startswith(replay):
+                                text = pending[len(replay):]
+                            else:
+                                text = "\n\n" + pending
+                            replay = ""
+                            if not text:
+                                continue
+                        if not round_text and parts:
+                            # Separate this round's text from the previous round's
+                            parts.append("\n\n")
+                            yield "\n\n"
+                        round_text += text
+                        parts.append(text)
+                        yield text
+                    response = stream.get_final_message()
+            except anthropic.AuthenticationError:
+                raise ConfigError(
+                    "Invalid API key. Please check your ANTHROPIC_API_KEY and try again."
+                )
+            except anthropic.RateLimitError:
+                raise APIError(
+                    "Rate limit exceeded. Please wait a moment and try again."
+                )
+            except anthropic.APIConnectionError:
+                raise APIError(
+                    "Cannot reach the Anthropic API. Please check your internet connection."
+                )
+            except anthropic.APIStatusError as e:
+                log.error(f"Anthropic API status error: {e.status_code} — {e.message}")
+                raise APIError(
+                    f"The AI service returned an error (HTTP {e.status_code}). Please try again later."
+                )
+            except Exception as e:
+                log.error(f"Unexpected API error: {e}")
+                raise APIError(
+                    "An unexpected error occurred while contacting the AI service. Please try again."
+                )
+
+            # A round cut off by the short budget may be missing tool calls;
+            # run it again with room to finish rather than treat it as done
+            if response.stop_reason != "max_tokens" or budget == MAX_TOKENS_LONG:
+                break
+            log.info("Round hit max_tokens on the short budget; retrying with the long one.")
+            budget = MAX_TOKENS_LONG
+
+        if response.stop_reason == "max_tokens":
+            log.error(f"Reply still truncated at max_tokens={MAX_TOKENS_LONG}.")
             raise APIError(
-                "An unexpected error occurred while contacting the AI service. Please try again."
+                "The assistant's reply was cut off before it finished. Please try a shorter request."
             )
 
         if response.stop_reason == "tool_use":
-            tool_results = []
-            for block in response.content:
-                if block.type == "tool_use":
-                    result = execute_tool(conn, block.name, block.input, user_id=user_id)
-                    tool_results.append(
-                        {
-                            "type": "tool_result",
-                            "tool_use_id": block.id,
-                            "content": result,
-                        }
-                    )
+            tool_uses = [b for b in response.content if b.type == "tool_use"]
+            tool_results = run_tool_round(conn, tool_uses, user_id=user_id)
+            # Only a task listing needs room to render many rows next turn
+            needs_long_output = any(b.name == "list_tasks" for b in tool_uses)
 
             messages.append({"role": "assistant", "content": response.content})
             messages.append({"role": "user", "content": tool_results})
         else:
-            # Extract the final text response
-            for block in response.content:
-                if hasattr(block, "text"):
-                    return block.text
-            return "I'm not sure how to help with that. Try something like 'add buy groceries' or 'show all tasks'."
+            if not parts:
+                fallback = "I'm not sure how to help with that. Try something like 'add buy groceries' or 'show all tasks'."
+                parts.append(fallback)
+                yield fallback
+            # Only a reply Claude finished on its own is safe to replay
+            if response.stop_reason == "end_turn":
+                _cache_response(conn, cache_key, "".join(parts))
+            return
 
 
 # ---------------------------------------------------------------------------
@@ -746,7 +1456,7 @@ def main():
         sys.exit(1)
 
     try:
-        conn = init_db()
+        conn = get_conn()
     except DatabaseError as e:
         print(f"\nDatabase error: {e}")
         sys.exit(1)
@@ -765,8 +1475,14 @@ def main():
                 break
 
             try:
-                response = process_user_input(conn, user_input)
-                print(f"\nAssistant: {response}")
+                # Print tokens as they arrive rather than after the full reply
+                started = False
+                for chunk in stream_user_input(conn, user_input):
+                    if not started:
+                        print("\nAssistant: ", end="")
+                        started = True
+                    print(chunk, end="", flush=True)
+                print()
             except InputError as e:
                 print(f"\nInput error: {e}")
             except ConfigError as e:
@@ -779,7 +1495,7 @@ def main():
                 log.error(f"Unexpected error: {e}")
                 print(f"\nUnexpected error: {e}")
     finally:
-        conn.close()
+        close_conn()
 
 
 if __name__ == "__main__":
@@ -4,29 +4,71 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
+import re
+import json
+import time
+import queue
 import sqlite3
 import logging
-from datetime import datetime
-from functools import wraps
-
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+
+import anthropic
+import orjson
+from flask import (
+    Flask, Response, render_template, request, jsonify, redirect, url_for, g,
+    stream_with_context,
+)
+from flask.json.provider import JSONProvider
 from flask_login import (
     LoginManager, UserMixin, login_user, logout_user,
     login_required, current_user,
 )
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.security import check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 
 from agent import (
-    DATABASE_PATH, TOOLS, SYSTEM_PROMPT, MODEL,
+    MODEL,
     ConfigError, DatabaseError, APIError, InputError,
-    init_db, _require_api_key, MAX_INPUT_LENGTH,
+    DB_MODE, init_db, connect_db, _require_api_key, _static_request_body, MAX_INPUT_LENGTH,
+    TOOL_HANDLERS, validate_user_input, today_str,
 )
 
 log = logging.getLogger("task-agent.web")
 
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider backed by orjson; responses are encoded straight to bytes."""
+
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=self._OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, option=self._OPTIONS), mimetype="application/json"
+        )
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.secret_key = os.environ.get("SECRET_KEY", os.urandom(32).hex())
 
+# Behind a reverse proxy (Render, nginx) remote_addr is the proxy's address;
+# trust that many X-Forwarded-For hops so per-client limits see the real client.
+_proxy_hops = int(os.environ.get("TRUSTED_PROXY_HOPS", "0"))
+if _proxy_hops:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=_proxy_hops)
+
 # ---------------------------------------------------------------------------
 # Flask-Login setup
 # ---------------------------------------------------------------------------
@@ -36,6 +78,18 @@ login_manager.init_app(app)
 login_manager.login_view = "login"
 login_manager.login_message = None  # suppress default flash message
 
+# Argon2id at the OWASP minimum (19 MiB, 2 passes).  Accounts created before
+# the switch still hold werkzeug hashes; they are upgraded on next login.
+_password_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+
+# Verified against for unknown usernames, so a miss costs the same as a wrong
+# password and response times don't reveal which usernames exist.
+_DUMMY_HASH = _password_hasher.hash("not-a-real-password")
+
+
+# Column order matches User.__init__ so rows can be passed positionally
+_SQL_USER = "SELECT id, username, email, password_hash, created_at FROM users"
+
 
 class User(UserMixin):
     """Lightweight user model backed by SQLite."""
@@ -50,11 +104,7 @@ class User(UserMixin):
     @staticmethod
     def get_by_id(user_id):
         try:
-            conn = get_db()
-            row = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
-            conn.close()
-            if row:
-                return User(**dict(row))
+            return User(*_user_row(user_id))
         except Exception:
             pass
         return None
@@ -63,10 +113,9 @@ class User(UserMixin):
     def get_by_username(username):
         try:
             conn = get_db()
-            row = conn.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
-            conn.close()
+            row = conn.execute(_SQL_USER + " WHERE username = ?", (username,)).fetchone()
             if row:
-                return User(**dict(row))
+                return User(*row)
         except Exception:
             pass
         return None
@@ -75,35 +124,94 @@ class User(UserMixin):
     def get_by_email(email):
         try:
             conn = get_db()
-            row = conn.execute("SELECT * FROM users WHERE email = ?", (email,)).fetchone()
-            conn.close()
+            row = conn.execute(_SQL_USER + " WHERE email = ?", (email,)).fetchone()
             if row:
-                return User(**dict(row))
+                return User(*row)
         except Exception:
             pass
         return None
 
+    @staticmethod
+    def get_auth_by_username(username):
+        """Return (id, password_hash) for login, or None if there's no such user."""
+        try:
+            conn = get_db()
+            row = conn.execute(
+                "SELECT id, password_hash FROM users WHERE username = ?", (username,)
+            ).fetchone()
+            if row:
+                return row[0], row[1]
+        except Exception:
+            pass
+        return None
+
+    @staticmethod
+    def verify_password(user_id, pw_hash, password):
+        """Verify password against the stored hash, upgrading it if outdated."""
+        if not pw_hash.startswith("$argon2"):
+            if not check_password_hash(pw_hash, password):
+                return False
+            User._rehash_password(user_id, password)
+            return True
+        try:
+            _password_hasher.verify(pw_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+        if _password_hasher.check_needs_rehash(pw_hash):
+            User._rehash_password(user_id, password)
+        return True
+
+    @staticmethod
+    def _rehash_password(user_id, password):
+        """Store a fresh Argon2 hash. Best-effort: a failure doesn't block login."""
+        pw_hash = _password_hasher.hash(password)
+        conn = get_db()
+        try:
+            with conn:
+                conn.execute(
+                    "UPDATE users SET password_hash = ? WHERE id = ?", (pw_hash, user_id)
+                )
+            _user_row.cache_clear()
+        except sqlite3.Error as e:
+            log.error(f"Failed to upgrade password hash for user {user_id}: {e}")
+
     @staticmethod
     def create(username, email, password):
         conn = get_db()
         try:
-            pw_hash = generate_password_hash(password)
+            pw_hash = _password_hasher.hash(password)
             cursor = conn.execute(
                 "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
                 (username, email, pw_hash),
             )
             conn.commit()
             user_id = cursor.lastrowid
-            conn.close()
             return User(user_id, username, email, pw_hash)
         except sqlite3.IntegrityError:
-            conn.close()
+            conn.rollback()
             return None
         except sqlite3.Error as e:
-            conn.close()
+            conn.rollback()
             raise DatabaseError(f"Failed to create user: {e}")
 
 
+USER_CACHE_SIZE = 1024  # user rows kept for the per-request user loader
+
+
+@lru_cache(maxsize=USER_CACHE_SIZE)
+def _user_row(user_id):
+    """The users row for user_id as a tuple, in User() argument order.
+
+    Rows only change when a password hash is upgraded, which clears the cache.
+    A missing user raises LookupError rather than returning None so the miss
+    isn't cached.
+    """
+    row = get_db().execute(_SQL_USER + " WHERE id = ?", (user_id,)).fetchone()
+    if row is None:
+        raise LookupError(f"No user with id {user_id}")
+    return tuple(row)
+
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.get_by_id(int(user_id))
@@ -124,28 +232,88 @@ def unauthorized():
 # Database helpers
 # ---------------------------------------------------------------------------
 
+# Warm connections kept between requests.  LIFO so the most recently used
+# (hottest page cache) handle goes out first; extras beyond the cap are closed.
+DB_POOL_SIZE = 8
+_DB_POOL = queue.LifoQueue(maxsize=DB_POOL_SIZE)
 
-def get_db():
-    """Get a database connection. Raises DatabaseError on failure."""
+
+def _acquire_db():
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA foreign_keys = ON")
-        return conn
-    except sqlite3.Error as e:
+        return _DB_POOL.get_nowait()
+    except queue.Empty:
+        pass
+    try:
+        # Shared setup with the CLI: PRAGMAs, statement cache, TASKS_DB_MODE
+        return connect_db(check_same_thread=False)
+    except DatabaseError as e:
         log.error(f"Failed to connect to database: {e}")
-        raise DatabaseError(f"Cannot connect to the database: {e}")
+        raise
+
+
+def _release_db(conn):
+    """Return a connection to the pool, discarding any open transaction."""
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        _DB_POOL.put_nowait(conn)
+    except (sqlite3.Error, queue.Full):
+        conn.close()
+
+
+def get_db():
+    """Get this request's database connection. Raises DatabaseError on failure.
+
+    The connection is borrowed from the pool on first use and returned by
+    release_db() when the request ends, so callers must not close it.
+    """
+    if "db" not in g:
+        g.db = _acquire_db()
+    return g.db
+
+
+@contextmanager
+def pooled_db():
+    """Borrow a pooled connection for just the enclosed block.
+
+    For code that spends most of its time off the database (waiting on
+    Claude), so the handle isn't tied up for the whole request.
+    """
+    conn = _acquire_db()
+    try:
+        yield conn
+    finally:
+        _release_db(conn)
+
+
+@app.teardown_appcontext
+def release_db(_exc):
+    """Return the request's connection to the pool at the end of the request."""
+    conn = g.pop("db", None)
+    if conn is not None:
+        _release_db(conn)
 
 
-def execute_tool(conn, tool_name, tool_input, user_id=None):
-    """Execute a tool handler — imported logic from agent.py."""
-    from agent import TOOL_HANDLERS
+def execute_tool(conn, tool_name, tool_input, user_id=None, changes=None):
+    """Execute a tool handler — imported logic from agent.py.
+
+    Row-level deltas for successful writes are appended to `changes` if given.
+    """
     handler = TOOL_HANDLERS.get(tool_name)
     if handler:
-        return handler(conn, tool_input, user_id=user_id)
+        return handler(conn, tool_input, user_id=user_id, changes=changes)
     return f"Unknown tool: {tool_name}"
 
 
+def _run_tool(conn, block, user_id, changes):
+    """Execute one tool_use block and wrap its output as a tool_result."""
+    return {
+        "type": "tool_result",
+        "tool_use_id": block.id,
+        "content": execute_tool(conn, block.name, block.input, user_id=user_id, changes=changes),
+    }
+
+
 # ---------------------------------------------------------------------------
 # Command processing
 # ---------------------------------------------------------------------------
@@ -160,134 +328,230 @@ def process_command(user_message, user_id=None):
         APIError     – Anthropic API call failed.
         InputError   – User input failed validation.
     """
-    import anthropic as _anthropic
-    _require_api_key()
-    from agent import client
+    return "".join(stream_command(user_message, user_id=user_id))
 
-    conn = get_db()
-    try:
-        # Validate input (reuse agent's validator)
-        from agent import validate_user_input
-        user_message = validate_user_input(user_message)
-
-        messages = [{"role": "user", "content": user_message}]
-        rounds = 0
-        max_rounds = 10
-
-        while True:
-            rounds += 1
-            if rounds > max_rounds:
-                raise APIError(
-                    "The assistant got stuck in a loop. Please try rephrasing your request."
-                )
 
-            try:
-                response = client.messages.create(
-                    model=MODEL,
-                    max_tokens=1024,
-                    system=SYSTEM_PROMPT,
-                    tools=TOOLS,
-                    messages=messages,
-                )
-            except _anthropic.AuthenticationError:
-                raise ConfigError(
-                    "Invalid API key. Please check your ANTHROPIC_API_KEY."
-                )
-            except _anthropic.RateLimitError:
-                raise APIError(
-                    "Rate limit exceeded. Please wait a moment and try again."
-                )
-            except _anthropic.APIConnectionError:
-                raise APIError(
-                    "Cannot reach the AI service. Please check your internet connection."
-                )
-            except _anthropic.APIStatusError as e:
-                log.error(f"API status error: {e.status_code}")
-                raise APIError(
-                    f"The AI service returned an error (HTTP {e.status_code}). Try again later."
-                )
-            except Exception as e:
-                log.error(f"Unexpected API error: {e}")
-                raise APIError(
-                    "An unexpected error occurred while contacting the AI. Please try again."
-                )
+def stream_command(user_message, user_id=None):
+    """Like process_command, but yield the reply text as Claude streams it.
 
-            if response.stop_reason == "tool_use":
-                tool_results = []
-                for block in response.content:
-                    if block.type == "tool_use":
-                        result = execute_tool(conn, block.name, block.input, user_id=user_id)
-                        tool_results.append({
-                            "type": "tool_result",
-                            "tool_use_id": block.id,
-                            "content": result,
-                        })
-                messages.append({"role": "assistant", "content": response.content})
-                messages.append({"role": "user", "content": tool_results})
-            else:
-                for block in response.content:
-                    if hasattr(block, "text"):
-                        return block.text
-                return "I'm not sure how to help with that."
-    finally:
-        conn.close()
+    Exceptions are the same as process_command's and surface during iteration.
+    """
+    client = _require_api_key()
+
+    # Validate input (reuse agent's validator)
+    user_message = validate_user_input(user_message)
+
+    messages = [{"role": "user", "content": user_message}]
+    emitted = False
+    rounds = 0
+    max_rounds = 10
 
+    while True:
+        rounds += 1
+        if rounds > max_rounds:
+            raise APIError(
+                "The assistant got stuck in a loop. Please try rephrasing your request."
+            )
 
-def get_all_tasks(user_id=None):
-    """Fetch all tasks for the given user. Raises DatabaseError on failure."""
+        try:
+            with client.messages.stream(
+                model=MODEL,
+                max_tokens=1024,
+                messages=messages,
+                # Prompt-cached system + tools, shared with the CLI
+                extra_body=_static_request_body(today_str()),
+            ) as stream:
+                new_round = True
+                for text in stream.text_stream:
+                    if new_round and emitted:
+                        # Separate this round's text from the previous round's
+                        yield "\n\n"
+                    new_round = False
+                    emitted = True
+                    yield text
+                response = stream.get_final_message()
+        except anthropic.AuthenticationError:
+            raise ConfigError(
+                "Invalid API key. Please check your ANTHROPIC_API_KEY."
+            )
+        except anthropic.RateLimitError:
+            raise APIError(
+                "Rate limit exceeded. Please wait a moment and try again."
+            )
+        except anthropic.APIConnectionError:
+            raise APIError(
+                "Cannot reach the AI service. Please check your internet connection."
+            )
+        except anthropic.APIStatusError as e:
+            log.error(f"API status error: {e.status_code}")
+            raise APIError(
+                f"The AI service returned an error (HTTP {e.status_code}). Try again later."
+            )
+        except Exception as e:
+            log.error(f"Unexpected API error: {e}")
+            raise APIError(
+                "An unexpected error occurred while contacting the AI. Please try again."
+            )
+
+        # A truncated round may have lost tool calls — never pass it off as the answer
+        if response.stop_reason == "max_tokens":
+            raise APIError(
+                "The assistant's reply was cut off before it finished. Please try a shorter request."
+            )
+
+        if response.stop_reason == "tool_use":
+            changes = []
+            rev = None
+            # One transaction per round — handlers don't commit themselves.
+            # The connection is only held for the round, not across API calls.
+            with pooled_db() as conn, conn:
+                tool_results = [
+                    _run_tool(conn, block, user_id, changes)
+                    for block in response.content
+                    if block.type == "tool_use"
+                ]
+                if changes:
+                    rev = _task_rev(conn, user_id)
+            if rev is not None:
+                _apply_task_changes(user_id, rev, changes)
+            messages += (
+                {"role": "assistant", "content": response.content},
+                {"role": "user", "content": tool_results},
+            )
+        else:
+            if not emitted:
+                yield "I'm not sure how to help with that."
+            return
+
+
+# overdue is a plain boolean expression (0/1), evaluated by SQLite per row
+_SQL_TASKS = (
+    "SELECT *, (due_date IS NOT NULL AND due_date != '' AND due_date < :today "
+    "AND status != 'completed') AS overdue FROM tasks"
+)
+
+
+def get_tasks_and_categories(user_id=None):
+    """Fetch the user's tasks and their distinct categories in one query.
+
+    Returns (tasks, categories). Raises DatabaseError on failure.
+    """
     conn = get_db()
+    params = {"today": today_str(), "user_id": user_id}
     try:
         if user_id is not None:
             rows = conn.execute(
-                "SELECT * FROM tasks WHERE user_id = ? ORDER BY id", (user_id,)
+                _SQL_TASKS + " WHERE user_id = :user_id ORDER BY id", params
             ).fetchall()
         else:
-            rows = conn.execute("SELECT * FROM tasks ORDER BY id").fetchall()
-        tasks = [dict(row) for row in rows]
-        today = datetime.now().strftime("%Y-%m-%d")
-        for task in tasks:
-            task["overdue"] = (
-                bool(task.get("due_date"))
-                and task["due_date"] < today
-                and task.get("status") != "completed"
-            )
-        return tasks
+            rows = conn.execute(_SQL_TASKS + " ORDER BY id", params).fetchall()
     except sqlite3.Error as e:
         log.error(f"Database error fetching tasks: {e}")
         raise DatabaseError(f"Failed to load tasks: {e}")
-    finally:
-        conn.close()
 
+    tasks = []
+    categories = set()
+    for row in rows:
+        task = dict(row)
+        task["overdue"] = bool(task["overdue"])
+        if task["category"]:
+            categories.add(task["category"])
+        tasks.append(task)
+    return tasks, sorted(categories)
+
+
+# ---------------------------------------------------------------------------
+# Per-user task list cache
+# ---------------------------------------------------------------------------
+
+TASK_CACHE_SIZE = 256  # users whose task lists are kept in memory per worker
+
+# user_id -> (rev, today, tasks, categories), least recently used first.
+# Entries are checked against task_revisions on every read, so a write made
+# through another worker or the CLI invalidates them too.
+_TASK_CACHE = OrderedDict()
+_task_cache_lock = threading.Lock()
+
+
+def _task_rev(conn, user_id):
+    """The user's task revision; triggers on tasks advance it once per row written."""
+    row = conn.execute(
+        "SELECT rev FROM task_revisions WHERE user_id = ?", (user_id,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def _is_overdue(task, today):
+    """Python twin of the overdue expression in _SQL_TASKS."""
+    return bool(task["due_date"]) and task["due_date"] < today and task["status"] != "completed"
+
+
+def _apply_task_changes(user_id, rev, changes):
+    """Patch the user's cached task list with a committed write's deltas.
+
+    Each delta is one row written, and so one revision.  Only an entry exactly
+    len(changes) revisions behind is patched: then these writes are the only
+    ones since it was read.  Anything else is dropped and reloaded.
+    """
+    today = today_str()
+    with _task_cache_lock:
+        entry = _TASK_CACHE.pop(user_id, None)
+        if entry is None or entry[0] != rev - len(changes) or entry[1] != today:
+            return
+        # Dicts keep insertion order and new ids only grow (AUTOINCREMENT),
+        # so the list stays ordered by id without re-sorting
+        by_id = {task["id"]: task for task in entry[2]}
+        for change in changes:
+            if change["op"] == "delete":
+                by_id.pop(change["id"], None)
+            else:
+                task = dict(change["row"])
+                task["overdue"] = _is_overdue(task, today)
+                by_id[task["id"]] = task
+        tasks = list(by_id.values())
+        categories = sorted({task["category"] for task in tasks if task["category"]})
+        _TASK_CACHE[user_id] = (rev, today, tasks, categories)
+
+
+def get_cached_tasks_and_categories(user_id):
+    """Like get_tasks_and_categories(), but reuses the last result until the
+    user's tasks change or the date rolls over. Raises DatabaseError on failure.
+    """
+    if user_id is None:
+        return get_tasks_and_categories(user_id)
 
-def get_categories(user_id=None):
-    """Fetch all distinct categories for the given user. Raises DatabaseError on failure."""
     conn = get_db()
+    today = today_str()
     try:
-        if user_id is not None:
-            rows = conn.execute(
-                "SELECT DISTINCT category FROM tasks "
-                "WHERE user_id = ? AND category IS NOT NULL AND category != '' "
-                "ORDER BY category",
-                (user_id,),
-            ).fetchall()
-        else:
-            rows = conn.execute(
-                "SELECT DISTINCT category FROM tasks WHERE category IS NOT NULL AND category != '' ORDER BY category"
-            ).fetchall()
-        return [row["category"] for row in rows]
+        # One read transaction, so the revision and the rows come from the
+        # same snapshot; _apply_task_changes relies on the pair matching.
+        conn.execute("BEGIN")
+        try:
+            rev = _task_rev(conn, user_id)
+            with _task_cache_lock:
+                entry = _TASK_CACHE.get(user_id)
+                if entry is not None and entry[0] == rev and entry[1] == today:
+                    _TASK_CACHE.move_to_end(user_id)
+                    return entry[2], entry[3]
+            tasks, categories = get_tasks_and_categories(user_id)
+        finally:
+            conn.commit()
     except sqlite3.Error as e:
-        log.error(f"Database error fetching categories: {e}")
-        raise DatabaseError(f"Failed to load categories: {e}")
-    finally:
-        conn.close()
+        log.error(f"Database error fetching tasks: {e}")
+        raise DatabaseError(f"Failed to load tasks: {e}")
+
+    with _task_cache_lock:
+        _TASK_CACHE[user_id] = (rev, today, tasks, categories)
+        _TASK_CACHE.move_to_end(user_id)
+        if len(_TASK_CACHE) > TASK_CACHE_SIZE:
+            _TASK_CACHE.popitem(last=False)
+    return tasks, categories
 
 
 # ---------------------------------------------------------------------------
 # Input validation helpers
 # ---------------------------------------------------------------------------
 
-import re
-
 _USERNAME_RE = re.compile(r"^[a-zA-Z0-9_]{3,30}$")
 _EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
 
@@ -305,6 +569,20 @@ def validate_signup(username, email, password):
     return True, ""
 
 
+def _validate_command(data):
+    """Validate a /api/command body. Returns (trimmed message, None) or (None, error)."""
+    if not data or not isinstance(data, dict):
+        return None, "Invalid request. Please send a JSON body with a 'message' field."
+    message = data.get("message")
+    message = message.strip() if isinstance(message, str) else ""
+    if not message:
+        return None, "Please enter a command. Try something like 'add buy groceries' or 'show all tasks'."
+    length = len(message)
+    if length > MAX_INPUT_LENGTH:
+        return None, f"Command is too long ({length} characters). Keep it under {MAX_INPUT_LENGTH}."
+    return message, None
+
+
 # ---------------------------------------------------------------------------
 # JSON error response builder
 # ---------------------------------------------------------------------------
@@ -327,6 +605,48 @@ def _error_response(exc):
     }), status
 
 
+# ---------------------------------------------------------------------------
+# Login throttling
+# ---------------------------------------------------------------------------
+
+LOGIN_MAX_FAILURES = 5      # failed logins allowed per client address...
+LOGIN_FAILURE_WINDOW = 60   # ...per this many seconds
+
+# Client address -> (window start, failures in window).  Per worker, so the
+# effective limit is LOGIN_MAX_FAILURES times the number of workers.  A
+# successful login does not reset the count — otherwise signing in to an
+# account of one's own between guesses would lift the limit entirely.
+_login_failures = {}
+_login_failures_lock = threading.Lock()
+
+
+def _login_blocked(addr):
+    """True if addr has used up its failed-login allowance for the window."""
+    with _login_failures_lock:
+        entry = _login_failures.get(addr)
+        if entry is None:
+            return False
+        if time.monotonic() - entry[0] >= LOGIN_FAILURE_WINDOW:
+            del _login_failures[addr]
+            return False
+        return entry[1] >= LOGIN_MAX_FAILURES
+
+
+def _record_login_failure(addr):
+    now = time.monotonic()
+    with _login_failures_lock:
+        entry = _login_failures.get(addr)
+        if entry is None or now - entry[0] >= LOGIN_FAILURE_WINDOW:
+            if len(_login_failures) >= 10000:
+                # Sweep expired windows so a spray of addresses can't grow this forever
+                for key in [k for k, (start, _n) in _login_failures.items()
+                            if now - start >= LOGIN_FAILURE_WINDOW]:
+                    del _login_failures[key]
+            _login_failures[addr] = (now, 1)
+        else:
+            _login_failures[addr] = (entry[0], entry[1] + 1)
+
+
 # ---------------------------------------------------------------------------
 # Auth routes
 # ---------------------------------------------------------------------------
@@ -345,10 +665,30 @@ def login():
         if not username or not password:
             return jsonify({"error": "Please enter both username and password."}), 400
 
-        user = User.get_by_username(username)
-        if not user or not check_password_hash(user.password_hash, password):
+        # Refuse before any lookup or hashing once an address keeps failing
+        addr = request.remote_addr or "unknown"
+        if _login_blocked(addr):
+            return jsonify({
+                "error": "Too many failed sign-in attempts. Please wait a minute and try again."
+            }), 429
+
+        auth = User.get_auth_by_username(username)
+        if auth:
+            ok = User.verify_password(auth[0], auth[1], password)
+        else:
+            try:
+                _password_hasher.verify(_DUMMY_HASH, password)
+            except VerificationError:
+                pass
+            ok = False
+        if not ok:
+            _record_login_failure(addr)
             return jsonify({"error": "Invalid username or password."}), 401
 
+        user = User.get_by_id(auth[0])
+        if not user:
+            return jsonify({"error": "Could not sign you in. Please try again."}), 500
+
         login_user(user, remember=True)
         return jsonify({"ok": True, "redirect": url_for("index")})
 
@@ -408,17 +748,26 @@ def index():
     return render_template("index.html", user=current_user)
 
 
+HEALTH_CACHE_TTL = 2.0  # seconds a healthy result is reused for
+
+# time.monotonic() of the last fully healthy check.  Load balancers poll often,
+# so a recent pass is reported without re-probing; failures are always re-checked.
+_last_healthy = 0.0
+
+
 @app.route("/api/health")
 def api_health():
     """Health-check endpoint — tests DB connectivity and API key presence."""
+    global _last_healthy
     checks = {"database": "ok", "api_key": "ok"}
+    if time.monotonic() - _last_healthy < HEALTH_CACHE_TTL:
+        return jsonify({"status": "healthy", "checks": checks}), 200
     status = 200
 
     # DB check
     try:
         conn = get_db()
         conn.execute("SELECT 1").fetchone()
-        conn.close()
     except Exception as e:
         checks["database"] = str(e)
         status = 503
@@ -430,6 +779,8 @@ def api_health():
         checks["api_key"] = str(e)
         status = 503
 
+    if status == 200:
+        _last_healthy = time.monotonic()
     return jsonify({"status": "healthy" if status == 200 else "unhealthy", "checks": checks}), status
 
 
@@ -438,10 +789,8 @@ def api_health():
 def api_tasks():
     """Return all tasks for the current user as JSON, plus metadata."""
     try:
-        return jsonify({
-            "tasks": get_all_tasks(user_id=current_user.id),
-            "categories": get_categories(user_id=current_user.id),
-        })
+        tasks, categories = get_cached_tasks_and_categories(current_user.id)
+        return jsonify({"tasks": tasks, "categories": categories})
     except DatabaseError as e:
         return _error_response(e)
     except Exception as e:
@@ -460,28 +809,18 @@ def api_command():
     except Exception:
         data = None
 
-    if not data or not isinstance(data, dict):
-        return jsonify({
-            "error": "Invalid request. Please send a JSON body with a 'message' field.",
-            "error_type": "input_error",
-        }), 400
-
-    user_message = data.get("message", "")
-    if isinstance(user_message, str):
-        user_message = user_message.strip()
-
     # --- Validate input ---
-    if not user_message:
-        return jsonify({
-            "error": "Please enter a command. Try something like 'add buy groceries' or 'show all tasks'.",
-            "error_type": "input_error",
-        }), 400
-
-    if len(user_message) > MAX_INPUT_LENGTH:
-        return jsonify({
-            "error": f"Command is too long ({len(user_message)} characters). Keep it under {MAX_INPUT_LENGTH}.",
-            "error_type": "input_error",
-        }), 400
+    user_message, error = _validate_command(data)
+    if error:
+        return jsonify({"error": error, "error_type": "input_error"}), 400
+
+    # --- Stream the reply as server-sent events if the client asked for it ---
+    if data.get("stream"):
+        return Response(
+            stream_with_context(_command_events(user_message, current_user.id)),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
     # --- Process (scoped to current user) ---
     try:
@@ -497,8 +836,7 @@ def api_command():
 
     # --- Build successful response (tasks may still fail) ---
     try:
-        all_tasks = get_all_tasks(user_id=current_user.id)
-        categories = get_categories(user_id=current_user.id)
+        all_tasks, categories = get_cached_tasks_and_categories(current_user.id)
     except DatabaseError:
         # Command succeeded but we can't refresh the task list
         all_tasks = []
@@ -511,6 +849,238 @@ def api_command():
     })
 
 
+def _sse(event, payload):
+    return f"event: {event}\ndata: {orjson.dumps(payload).decode()}\n\n"
+
+
+def _command_events(user_message, user_id):
+    """SSE body for a streamed /api/command: `text` events carrying reply
+    chunks, then one `done` event with the refreshed task list, or one `error`
+    event shaped like the JSON error responses."""
+    try:
+        for chunk in stream_command(user_message, user_id=user_id):
+            yield _sse("text", {"text": chunk})
+    except (InputError, ConfigError, DatabaseError, APIError) as e:
+        _status, error_type = _ERROR_MAP[type(e)]
+        yield _sse("error", {"error": str(e), "error_type": error_type})
+        return
+    except Exception as e:
+        log.error(f"Unexpected error in /api/command: {e}")
+        yield _sse("error", {
+            "error": "Something went wrong. Please try again.",
+            "error_type": "server_error",
+        })
+        return
+
+    try:
+        all_tasks, categories = get_cached_tasks_and_categories(user_id)
+    except DatabaseError:
+        # Command succeeded but we can't refresh the task list
+        all_tasks = []
+        categories = []
+    yield _sse("done", {"tasks": all_tasks, "categories": categories})
+
+
+# ---------------------------------------------------------------------------
+# Batch commands (Anthropic Message Batches API)
+# ---------------------------------------------------------------------------
+
+MAX_BATCH_COMMANDS = 100  # commands accepted per /api/command/batch request
+
+
+def _batch_api_call(fn, *args, **kwargs):
+    """Call a batches endpoint, mapping SDK errors to ConfigError / APIError."""
+    try:
+        return fn(*args, **kwargs)
+    except anthropic.AuthenticationError:
+        raise ConfigError("Invalid API key. Please check your ANTHROPIC_API_KEY.")
+    except anthropic.NotFoundError:
+        raise APIError("The AI service no longer has this batch.")
+    except anthropic.APIStatusError as e:
+        log.error(f"API status error: {e.status_code}")
+        raise APIError(
+            f"The AI service returned an error (HTTP {e.status_code}). Try again later."
+        )
+    except anthropic.APIError as e:
+        log.error(f"Batch API error: {e}")
+        raise APIError("Cannot reach the AI service. Please try again later.")
+
+
+def submit_command_batch(messages, user_id):
+    """Queue commands as one Message Batch and record it. Returns the batch id.
+
+    Raises InputError, ConfigError, APIError or DatabaseError.
+    """
+    if not isinstance(messages, list) or not messages:
+        raise InputError("Send a non-empty 'messages' list.")
+    if len(messages) > MAX_BATCH_COMMANDS:
+        raise InputError(f"A batch can hold at most {MAX_BATCH_COMMANDS} commands.")
+    if not all(isinstance(m, str) for m in messages):
+        raise InputError("Every command in a batch must be a string.")
+    messages = [validate_user_input(m.strip()) for m in messages]
+
+    client = _require_api_key()
+    static = _static_request_body(today_str())
+    batch = _batch_api_call(
+        client.messages.batches.create,
+        requests=[
+            {
+                "custom_id": f"cmd-{i}",
+                "params": {
+                    "model": MODEL,
+                    "max_tokens": 1024,
+                    "messages": [{"role": "user", "content": message}],
+                    **static,
+                },
+            }
+            for i, message in enumerate(messages)
+        ],
+    )
+
+    conn = get_db()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO command_batches (id, user_id, messages) VALUES (?, ?, ?)",
+                (batch.id, user_id, json.dumps(messages)),
+            )
+    except sqlite3.Error as e:
+        log.error(f"Database error recording batch {batch.id}: {e}")
+        raise DatabaseError(f"Failed to record batch: {e}")
+    return batch.id
+
+
+def _apply_batch_result(conn, message, user_id, changes):
+    """Run one result's tool calls and return the reply.
+
+    Batched commands get a single Claude round, so the reply is the model's
+    text followed by the tool handlers' own confirmations.
+    """
+    lines = [block.text for block in message.content if block.type == "text"]
+    for block in message.content:
+        if block.type == "tool_use":
+            lines.append(execute_tool(
+                conn, block.name, block.input, user_id=user_id, changes=changes
+            ))
+    return "\n".join(lines) or "I'm not sure how to help with that."
+
+
+def collect_command_batch(batch_id, user_id):
+    """Return (status, results) for a batch, applying its tool calls once it ends.
+
+    results is None while the batch is still processing. Returns None if the
+    batch doesn't belong to the user. Raises ConfigError, APIError or
+    DatabaseError.
+    """
+    conn = get_db()
+    try:
+        row = conn.execute(
+            "SELECT messages, status, results FROM command_batches WHERE id = ? AND user_id = ?",
+            (batch_id, user_id),
+        ).fetchone()
+    except sqlite3.Error as e:
+        raise DatabaseError(f"Failed to load batch: {e}")
+    if row is None:
+        return None
+    if row["status"] == "applied":
+        return "applied", json.loads(row["results"])
+
+    client = _require_api_key()
+    batch = _batch_api_call(client.messages.batches.retrieve, batch_id)
+    if batch.processing_status != "ended":
+        return batch.processing_status, None
+    entries = {
+        entry.custom_id: entry.result
+        for entry in _batch_api_call(client.messages.batches.results, batch_id)
+    }
+
+    messages = json.loads(row["messages"])
+    changes = []
+    rev = None
+    try:
+        with conn:
+            # Claim the batch so a repeated poll (or another worker) can't
+            # apply the same writes twice
+            claimed = conn.execute(
+                "UPDATE command_batches SET status = 'applied' WHERE id = ? AND status = 'pending'",
+                (batch_id,),
+            ).rowcount
+            if claimed:
+                results = []
+                for i, message in enumerate(messages):
+                    result = entries.get(f"cmd-{i}")
+                    if result is None or result.type != "succeeded":
+                        outcome = result.type if result is not None else "missing"
+                        results.append({"message": message, "error": f"Command {outcome}."})
+                        continue
+                    reply = _apply_batch_result(conn, result.message, user_id, changes)
+                    results.append({"message": message, "reply": reply})
+                if changes:
+                    rev = _task_rev(conn, user_id)
+                conn.execute(
+                    "UPDATE command_batches SET results = ? WHERE id = ?",
+                    (json.dumps(results), batch_id),
+                )
+        if not claimed:
+            results = json.loads(conn.execute(
+                "SELECT results FROM command_batches WHERE id = ?", (batch_id,)
+            ).fetchone()["results"])
+    except sqlite3.Error as e:
+        log.error(f"Database error applying batch {batch_id}: {e}")
+        raise DatabaseError(f"Failed to apply batch results: {e}")
+    if rev is not None:
+        _apply_task_changes(user_id, rev, changes)
+    return "applied", results
+
+
+@app.route("/api/command/batch", methods=["POST"])
+@login_required
+def api_command_batch():
+    """Queue several commands at batch pricing. Poll the returned id for results."""
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data, dict):
+        return jsonify({
+            "error": "Invalid request. Please send a JSON body with a 'messages' list.",
+            "error_type": "input_error",
+        }), 400
+
+    try:
+        batch_id = submit_command_batch(data.get("messages"), current_user.id)
+    except (InputError, ConfigError, DatabaseError, APIError) as e:
+        return _error_response(e)
+    except Exception as e:
+        log.error(f"Unexpected error in /api/command/batch: {e}")
+        return jsonify({
+            "error": "Something went wrong. Please try again.",
+            "error_type": "server_error",
+        }), 500
+
+    return jsonify({"batch_id": batch_id, "status": "in_progress"}), 202
+
+
+@app.route("/api/command/batch/<batch_id>")
+@login_required
+def api_command_batch_status(batch_id):
+    """Report a batch's progress; once it has ended, apply and return its replies."""
+    try:
+        outcome = collect_command_batch(batch_id, current_user.id)
+    except (ConfigError, DatabaseError, APIError) as e:
+        return _error_response(e)
+    except Exception as e:
+        log.error(f"Unexpected error in /api/command/batch: {e}")
+        return jsonify({
+            "error": "Something went wrong. Please try again.",
+            "error_type": "server_error",
+        }), 500
+
+    if outcome is None:
+        return jsonify({"error": "Batch not found", "error_type": "not_found"}), 404
+    status, results = outcome
+    if results is None:
+        return jsonify({"batch_id": batch_id, "status": status}), 202
+    return jsonify({"batch_id": batch_id, "status": status, "results": results})
+
+
 # ---------------------------------------------------------------------------
 # Global error handlers
 # ---------------------------------------------------------------------------
@@ -535,8 +1105,19 @@ def internal_error(_e):
 # Startup — init DB when module loads (works for both gunicorn and __main__)
 # ---------------------------------------------------------------------------
 
+# Memory mode gives each thread its own shared-cache connection, and
+# shared-cache table locks fail a concurrent read/write immediately instead of
+# waiting.  Threaded servers (gthread workers, the dev server) would hit that
+# on ordinary traffic, so the web app doesn't run in that mode.
+if DB_MODE == "memory":
+    raise ConfigError(
+        "TASKS_DB_MODE=memory is only supported by the CLI (python agent.py). "
+        "Unset it to run the web app."
+    )
+
 try:
-    init_db()
+    # Requests use pooled connections; this one only exists for the setup
+    init_db().close()
 except DatabaseError as e:
     log.error(f"Database init failed: {e}")
     # Don't crash — health endpoint will report the issue